@@ -1,13 +1,22 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import pyupbit
 import plotly.graph_objects as go
-from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import datetime
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
 
 
 # Function to download data for a single cryptocurrency
 def download_crypto_data(ticker):
+    import yfinance as yf
+
     try:
         data = yf.download(ticker, period="1y", interval="1d")
         if data.empty:
@@ -35,6 +44,8 @@ def analyze_crypto(data):
 
 # Function to plot analysis results
 def plot_crypto_analysis(data, ticker):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(12, 6))
     plt.plot(data.index, data["Adj Close"], label="Adjusted Close Price", alpha=0.7)
     plt.plot(data.index, data["SMA_20"], label="20-Day SMA", alpha=0.7)
@@ -66,87 +77,246 @@ def plot_crypto_analysis(data, ticker):
     plt.show()
 
 
-# List of cryptocurrencies to analyze (add more tickers as needed)
-crypto_tickers = ["BTC-USD", "ETH-USD", "ADA-USD"]
+# Standalone yfinance demo; only runs when DEMO is set (see bottom of file)
+def _demo():
+    # List of cryptocurrencies to analyze (add more tickers as needed)
+    crypto_tickers = ["BTC-USD", "ETH-USD", "ADA-USD"]
 
-# Download data concurrently
-with ThreadPoolExecutor() as executor:
-    crypto_data_list = list(executor.map(download_crypto_data, crypto_tickers))
+    # Download data concurrently
+    with ThreadPoolExecutor() as executor:
+        crypto_data_list = list(executor.map(download_crypto_data, crypto_tickers))
 
-# Analyze and plot each cryptocurrency
-df_combined = pd.DataFrame()
-for i, data in enumerate(crypto_data_list):
-    if data is not None:
-        analyzed_data = analyze_crypto(data)
-        df_combined = pd.concat([df_combined, analyzed_data])
-        plot_crypto_analysis(analyzed_data, crypto_tickers[i])
+    # Analyze and plot each cryptocurrency
+    df_combined = pd.DataFrame()
+    for i, data in enumerate(crypto_data_list):
+        if data is not None:
+            analyzed_data = analyze_crypto(data)
+            df_combined = pd.concat([df_combined, analyzed_data])
+            plot_crypto_analysis(analyzed_data, crypto_tickers[i])
 
 
 # Streamlit page setup
 st.set_page_config(page_title="Crypto Analysis", page_icon="💰", layout="wide")
 
+RESULTS_DIR = Path(__file__).resolve().parent / "cache"
+# Don't persist a run that lost more than this share of coins (e.g. to 429s)
+MIN_SAVE_COVERAGE = 0.95
+SIGNAL_NAMES = ("Above MA200", "MA200 Trending Up")
+
+
+# Shared (not copied) across sessions, so callers must not mutate the list
+@st.cache_resource(ttl=3600, show_spinner=False)
+def _fetch_krw_tickers():
+    return pyupbit.get_tickers(fiat="KRW")
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _fetch_ohlcv(symbol, day_bucket):
+    # day_bucket only keys the cache so that daily candles roll over at midnight
+    df = pyupbit.get_ohlcv(symbol, interval="day", count=252)
+    if df is None:
+        # pyupbit swallows request errors (including 429s) and returns None;
+        # raise so the miss is not cached and the next click retries it.
+        raise ValueError("no OHLCV data returned")
+    return df
+
 
 def get_krw_tickers():
     try:
-        return pyupbit.get_tickers(fiat="KRW")
+        return _fetch_krw_tickers()
     except Exception as e:
         st.error(f"Error fetching tickers: {e}")
         return []
 
 
+def _rolling_mean(values, window):
+    # O(N) running-sum moving average of a 1-D, NaN-free series; the first
+    # window - 1 entries are NaN, as with pandas rolling(window).mean().
+    sums = np.concatenate([[0.0], np.cumsum(values)])
+    out = np.full(len(values), np.nan)
+    out[window - 1 :] = (sums[window:] - sums[:-window]) / window
+    return out
+
+
 def fetch_coin_data(symbol):
     try:
-        df = pyupbit.get_ohlcv(symbol, interval="day", count=252)
-        if df is not None and not df.empty:
-            df["MA200"] = df["close"].rolling(window=200).mean()
-        return df
+        return _fetch_ohlcv(symbol, datetime.date.today().isoformat())
     except Exception as e:
         st.error(f"Error fetching data for {symbol}: {e}")
         return None
 
 
-def calculate_signals(df):
+def fetch_all_coin_data(symbols, progress):
+    # Network stage only: keep the pool busy with HTTP and leave the
+    # indicator work to the caller once every download has returned.
+    # Worker threads need the script run context, otherwise st.cache_data
+    # silently skips both reads and writes and every click re-downloads.
+    ctx = get_script_run_ctx()
+    coin_data = {}
+    with ThreadPoolExecutor(
+        max_workers=5,
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+    ) as executor:
+        futures = {
+            executor.submit(fetch_coin_data, symbol): symbol for symbol in symbols
+        }
+        last_update = 0.0
+        for i, future in enumerate(as_completed(futures)):
+            data = future.result()
+            if data is not None:
+                coin_data[futures[future]] = data
+            # Throttle widget updates to ~10/s; always report the final one.
+            now = time.monotonic()
+            if now - last_update > 0.1 or i == len(symbols) - 1:
+                progress.progress((i + 1) / len(symbols))
+                last_update = now
+    return coin_data
+
+
+def calculate_all_signals(coin_data):
+    # Right-align every coin's closes in one (days x coins) array; shorter
+    # histories are NaN-padded on the left so their MA200 comes out NaN.
+    # Only MA200 today and 30 candles ago are needed, so take those two
+    # window means directly instead of materialising the full rolling series.
+    # float32 is plenty for these comparisons; the means accumulate in float64.
     try:
-        if len(df) >= 200:
-            latest = df.iloc[-1]
-            prev_month = df.iloc[-30]
-
-            signals = {
-                "Above MA200": latest["close"] > latest["MA200"],
-                "MA200 Trending Up": latest["MA200"] > prev_month["MA200"],
-            }
-            return signals
-        return {}
+        symbols = list(coin_data)
+        if not symbols:
+            return {}
+        lengths = [len(coin_data[symbol]) for symbol in symbols]
+        closes = np.full((max(lengths), len(symbols)), np.nan, dtype=np.float32)
+        for col, symbol in enumerate(symbols):
+            if lengths[col]:
+                closes[-lengths[col] :, col] = coin_data[symbol]["close"].to_numpy()
+
+        ma200_now = closes[-200:].mean(axis=0, dtype=np.float64)
+        ma200_prev = (
+            closes[-229:-29].mean(axis=0, dtype=np.float64)
+            if len(closes) >= 229
+            else np.full(len(symbols), np.nan)
+        )
+        above_ma200 = closes[-1] > ma200_now
+        ma200_rising = ma200_now > ma200_prev
+
+        return {
+            symbol: (
+                dict(zip(SIGNAL_NAMES, (above_ma200[col], ma200_rising[col])))
+                if lengths[col] >= 200
+                else {}
+            )
+            for col, symbol in enumerate(symbols)
+        }
     except Exception as e:
         st.error(f"Error calculating signals: {e}")
         return {}
 
 
+# Returned as a shared object (no pickling); st.plotly_chart does not mutate it.
+# ttl matches _fetch_ohlcv so charts never lag the data the signals use.
+@st.cache_resource(ttl=300, max_entries=500, show_spinner=False)
+def _build_chart(symbol, last_candle, candle_count, _df):
+    # _df is not hashed; the symbol and its latest candle (timestamp plus the
+    # still-moving intraday OHLC values) identify the data.
+    fig = go.Figure()
+    fig.add_trace(
+        go.Candlestick(
+            x=_df.index,
+            open=_df["open"],
+            high=_df["high"],
+            low=_df["low"],
+            close=_df["close"],
+            name="Price",
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=_df.index,
+            y=_rolling_mean(_df["close"].to_numpy(dtype=float), 200),
+            line=dict(color="red", width=2),
+            name="MA200",
+        )
+    )
+    fig.update_layout(title=f"{symbol} Price Chart", template="plotly_white")
+    return fig
+
+
 def plot_chart(symbol, df):
     try:
-        fig = go.Figure()
-        fig.add_trace(
-            go.Candlestick(
-                x=df.index,
-                open=df["open"],
-                high=df["high"],
-                low=df["low"],
-                close=df["close"],
-                name="Price",
-            )
+        last_candle = (
+            (df.index[-1], *df[["open", "high", "low", "close"]].iloc[-1])
+            if len(df)
+            else None
         )
-        fig.add_trace(
-            go.Scatter(
-                x=df.index, y=df["MA200"], line=dict(color="red", width=2), name="MA200"
-            )
-        )
-        fig.update_layout(title=f"{symbol} Price Chart", template="plotly_white")
-        return fig
+        return _build_chart(symbol, last_candle, len(df), df)
     except Exception as e:
         st.error(f"Error creating chart for {symbol}: {e}")
         return go.Figure()
 
 
+def _results_paths():
+    # One pair of files per calendar day, so yesterday's results are never
+    # reused: the signal table as Parquet, the charted OHLCV frames pickled.
+    day = f"{datetime.date.today():%Y%m%d}"
+    return RESULTS_DIR / f"signals_{day}.parquet", RESULTS_DIR / f"charts_{day}.pkl"
+
+
+def _replace_atomically(path, write):
+    # Write to a temp file and swap it in, so another session reading the
+    # day's file never sees a half-written one.
+    fd, tmp_path = tempfile.mkstemp(dir=RESULTS_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def save_results(coin_data, signals):
+    signals_path, charts_path = _results_paths()
+    try:
+        table = pd.DataFrame({"Symbol": list(signals)})
+        for name in SIGNAL_NAMES:
+            table[name] = pd.Series(
+                [signals[symbol].get(name) for symbol in signals], dtype="boolean"
+            )
+        RESULTS_DIR.mkdir(exist_ok=True)
+        _replace_atomically(charts_path, lambda tmp: pd.to_pickle(coin_data, tmp))
+        _replace_atomically(signals_path, lambda tmp: table.to_parquet(tmp))
+    except Exception as e:
+        st.error(f"Error saving results: {e}")
+
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def _read_results(signals_path, charts_path, mtimes):
+    # mtimes only keys the cache, so a newer save is picked up on next rerun
+    table = pd.read_parquet(signals_path)
+    # Coins with too little history were saved with null signals
+    signals = {
+        row["Symbol"]: (
+            {}
+            if pd.isna(row[SIGNAL_NAMES[0]])
+            else {name: bool(row[name]) for name in SIGNAL_NAMES}
+        )
+        for row in table.to_dict("records")
+    }
+    return pd.read_pickle(charts_path), signals
+
+
+def load_results():
+    signals_path, charts_path = _results_paths()
+    if not (signals_path.exists() and charts_path.exists()):
+        return {}, {}, None
+    try:
+        mtimes = (signals_path.stat().st_mtime, charts_path.stat().st_mtime)
+        coin_data, signals = _read_results(str(signals_path), str(charts_path), mtimes)
+        return coin_data, signals, datetime.datetime.fromtimestamp(mtimes[0])
+    except Exception as e:
+        st.error(f"Error loading saved results: {e}")
+        return {}, {}, None
+
+
 def main():
     st.title("💰 Cryptocurrency Analysis Dashboard")
 
@@ -159,29 +329,33 @@ def main():
             st.error("No tickers found.")
             return
 
-        all_data = []
         progress = st.progress(0)
-
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {
-                executor.submit(fetch_coin_data, symbol): symbol for symbol in symbols
-            }
-            for i, future in enumerate(futures):
-                symbol = futures[future]
-                data = future.result()
-                if data is not None:
-                    signals = calculate_signals(data)
-                    all_data.append(
-                        {"Symbol": symbol, "Signals": signals, "Data": data}
-                    )
-                progress.progress((i + 1) / len(symbols))
-
-        if all_data:
+        coin_data = fetch_all_coin_data(symbols, progress)
+
+        signals = calculate_all_signals(coin_data)
+        if len(coin_data) >= MIN_SAVE_COVERAGE * len(symbols):
+            save_results(coin_data, signals)
+        else:
+            st.warning(
+                f"Only {len(coin_data)} of {len(symbols)} coins could be "
+                "downloaded; results were not saved."
+            )
+        if coin_data:
             st.success("Analysis complete.")
-            for coin in all_data:
-                with st.expander(f"{coin['Symbol']}"):
-                    st.plotly_chart(plot_chart(coin["Symbol"], coin["Data"]))
+    else:
+        coin_data, signals, saved_at = load_results()
+        if coin_data:
+            st.info(
+                f"Showing results saved at {saved_at:%Y-%m-%d %H:%M}. "
+                "Click Start Analysis to refresh."
+            )
+
+    for symbol, data in coin_data.items():
+        with st.expander(f"{symbol}"):
+            st.plotly_chart(plot_chart(symbol, data))
 
 
 if __name__ == "__main__":
+    if os.getenv("DEMO"):
+        _demo()
     main()